@@ -0,0 +1,122 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+from flux_tube import closed_lines, line_index, segment_lengths, cumulative_trapezoid, load_field_lines
+
+# Lines are only compared with lines traced from the same place at the same epoch
+EPOCH_KEYS = ['Year', 'Day', 'Place', 'Hour']
+
+
+def describe_file(file_name):
+    """
+    Extracts the year, the day of the year, the model, the place code and the hour from the filename
+    pattern "B_(day)_(year)_(model)_(place code)_(hour).txt".
+    Other files (e.g. plot_alfven/T01.txt) take the model from the file name and
+    use the directory name as the place code, so traces stored together are compared together.
+    """
+    base_name = os.path.basename(file_name)
+    match = re.search(r'B_(\d+)_(\d{4})_(\w+?)_(\w{3})_(\d{2})\.txt', base_name)
+    if match:
+        day, year, model, place, hour = match.groups()
+        return year, day, model, place, hour
+    model = os.path.splitext(base_name)[0]
+    return "", "", model, os.path.basename(os.path.dirname(os.path.abspath(file_name))), ""
+
+
+def normalized_arc_length(data, offsets):
+    """
+    Returns the arc length of every point divided by the length of its line (0 ... 1 along every line).
+    """
+    ds = segment_lengths(data[:, :3], offsets)
+    running, length = cumulative_trapezoid(np.ones(len(data)), ds, offsets)
+    length = np.where(length > 0, length, 1.0)
+    return running / np.repeat(length, np.diff(offsets))
+
+
+def resample_lines(data, offsets, n_samples=200):
+    """
+    Resamples every line of the ragged layout onto a common grid of n_samples points
+    equally spaced in normalized arc length, with a single vectorized linear interpolation.
+    Returns an (L, n_samples, 8) array and the grid itself.
+    """
+    grid = np.linspace(0.0, 1.0, n_samples)
+    n_lines = len(offsets) - 1
+    lines = line_index(offsets)
+
+    # Lines are separated by a gap of 1 in the key, so a search never lands in the neighbouring line
+    key = 2.0 * lines + normalized_arc_length(data, offsets)
+    query = (2.0 * np.arange(n_lines)[:, None] + grid[None, :]).ravel()
+
+    upper = np.searchsorted(key, query, side='left')
+    first = np.repeat(offsets[:-1], n_samples)
+    last = np.repeat(offsets[1:] - 1, n_samples)
+    upper = np.clip(upper, np.minimum(first + 1, last), last)
+    lower = np.maximum(upper - 1, first)
+
+    span = key[upper] - key[lower]
+    t = np.divide(query - key[lower], span, out=np.zeros_like(span), where=span > 0)
+    t = np.clip(t, 0.0, 1.0)
+    resampled = data[lower] + t[:, None] * (data[upper] - data[lower])
+    return resampled.reshape(n_lines, n_samples, data.shape[1]), grid
+
+
+def model_pairs(descriptions):
+    """
+    Lists every pair of lines traced from the same place at the same epoch (year, day and hour)
+    with different models.
+    descriptions is a DataFrame with the Year, Day, Model, Place and Hour columns, one row per line.
+    """
+    lines = descriptions.reset_index(drop=True).rename_axis('Line').reset_index()
+    pairs = lines.merge(lines, on=EPOCH_KEYS, suffixes=('_a', '_b'))
+    pairs = pairs[pairs['Model_a'] < pairs['Model_b']]
+    return pairs.sort_values(EPOCH_KEYS + ['Model_a', 'Model_b']).reset_index(drop=True)
+
+
+def compare_lines(resampled, line_a, line_b, closed=None):
+    """
+    Computes the divergence of the paired lines on the common grid.
+    closed flags the closed lines (see flux_tube.closed_lines); the footprint separation is the
+    distance between the conjugate footpoints and is NaN unless both lines of a pair are closed.
+    Returns the per-point position offset [Re] and |B| ratio (both (P, n_samples))
+    and a DataFrame of per-pair metrics.
+    """
+    a = resampled[line_a]
+    b = resampled[line_b]
+    offset = np.linalg.norm(a[:, :, :3] - b[:, :, :3], axis=2)
+    ratio = a[:, :, 7] / b[:, :, 7]
+    log_ratio = np.log(ratio)
+    both_closed = np.ones(len(line_a), dtype=bool) if closed is None else closed[line_a] & closed[line_b]
+
+    metrics = pd.DataFrame({
+        'Offset_mean_Re': offset.mean(axis=1),
+        'Offset_max_Re': offset.max(axis=1),
+        'B_ratio_min': ratio.min(axis=1),
+        'B_ratio_max': ratio.max(axis=1),
+        'B_ratio_rms_log': np.sqrt((log_ratio**2).mean(axis=1)),
+        'Footprint_separation_Re': np.where(both_closed, offset[:, -1], np.nan),
+    })
+    return offset, ratio, metrics
+
+
+def compare_models(data, offsets, file_names, n_samples=200):
+    """
+    Compares every model pair for every place and epoch (year, day, hour) found among file_names.
+    Returns the pair table with the metrics of compare_lines and the per-point offsets and ratios.
+    """
+    descriptions = pd.DataFrame([describe_file(file_name) for file_name in file_names], columns=['Year', 'Day', 'Model', 'Place', 'Hour'])
+    pairs = model_pairs(descriptions)
+    resampled, _ = resample_lines(data, offsets, n_samples)
+    closed = closed_lines(data, offsets)
+    offset, ratio, metrics = compare_lines(resampled, pairs['Line_a'].to_numpy(), pairs['Line_b'].to_numpy(), closed)
+    table = pd.concat([pairs[EPOCH_KEYS + ['Model_a', 'Model_b']], metrics], axis=1)
+    return table, offset, ratio
+
+
+# Main execution
+if __name__ == "__main__":
+    for directory, pattern in [("../../data", "B_*.txt"), ("plot_alfven", "T*.txt")]:
+        data, offsets, file_names = load_field_lines(directory, pattern)
+        table, _, _ = compare_models(data, offsets, file_names)
+        print(table.to_string(index=False))
@@ -0,0 +1,171 @@
+import os
+import fnmatch
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['XGSM', 'YGSM', 'ZGSM', 'Radius', 'BXGSM', 'BYGSM', 'BZGSM', 'B']
+
+
+def load_field_line(file_name):
+    """
+    Loads one traced field line into an (N, 8) array with the columns of COLUMNS.
+    Works with both the plain CCMC output (two header rows) and the files saved by
+    data_fetcher.ipynb (request parameters in '#' comment lines before the header).
+    """
+    rows = []
+    with open(file_name, 'r') as infile:
+        for line in infile:
+            values = line.split()
+            if len(values) != len(COLUMNS):
+                continue
+            try:
+                rows.append([float(value) for value in values])
+            except ValueError:
+                continue  # Header or units row
+    return np.array(rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+
+
+def concatenate_lines(lines):
+    """
+    Packs a list of (N_i, 8) field line arrays into the ragged layout used by this module:
+    one (sum N_i, 8) array with all the points and an offsets array of length len(lines) + 1,
+    so that line i is data[offsets[i]:offsets[i + 1]].
+    """
+    lengths = np.array([len(line) for line in lines], dtype=np.int64)
+    if (lengths == 0).any():
+        raise ValueError("Empty field lines cannot be packed")
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    return np.concatenate(lines, axis=0), offsets
+
+
+def load_field_lines(directory, file_pattern="B_*.txt"):
+    """
+    Loads every file matching file_pattern in directory (recursively) into the ragged layout.
+    Returns the data, the offsets and the list of file names (one per line).
+    """
+    file_names = []
+    for root, _, files in os.walk(directory):
+        for file_name in sorted(fnmatch.filter(files, file_pattern)):
+            file_names.append(os.path.join(root, file_name))
+    lines = [load_field_line(file_name) for file_name in file_names]
+    data, offsets = concatenate_lines(lines)
+    return data, offsets, file_names
+
+
+def line_index(offsets):
+    """
+    Returns the line number of every point of the ragged layout.
+    """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def segment_lengths(xyz, offsets):
+    """
+    Returns the length of the segment starting at every point.
+    The last point of each line has no segment and gets 0, so no segment joins two lines.
+    """
+    ds = np.zeros(len(xyz))
+    ds[:-1] = np.linalg.norm(np.diff(xyz, axis=0), axis=1)
+    ds[offsets[1:] - 1] = 0
+    return ds
+
+
+def cumulative_trapezoid(values, ds, offsets):
+    """
+    Cumulative trapezoid integral of values along every line of the ragged layout.
+    Returns the running integral at every point (0 at the first point of each line)
+    and the total integral of every line.
+    """
+    segment = np.zeros(len(values))
+    segment[:-1] = 0.5 * (values[:-1] + values[1:]) * ds[:-1]
+    csum = np.concatenate(([0.0], np.cumsum(segment)))
+    starts = np.repeat(offsets[:-1], np.diff(offsets))
+    running = csum[:-1] - csum[starts]
+    total = csum[offsets[1:] - 1] - csum[offsets[:-1]]
+    return running, total
+
+
+def equatorial_crossing(data, offsets):
+    """
+    Finds the first ZGSM sign change along every line and linearly interpolates the crossing.
+    Returns an (L, 4) array with XGSM, YGSM, ZGSM (= 0) and B at the crossing,
+    NaN for lines that never cross the equatorial plane.
+    """
+    z = data[:, 2]
+    crossing = np.zeros(len(data), dtype=bool)
+    crossing[:-1] = np.signbit(z[:-1]) != np.signbit(z[1:])
+    crossing[offsets[1:] - 1] = False
+    crossings = np.flatnonzero(crossing)
+
+    result = np.full((len(offsets) - 1, 4), np.nan)
+    if len(crossings) == 0:
+        return result
+    # The first crossing at or after the start of every line, if it is still inside that line
+    first = np.searchsorted(crossings, offsets[:-1])
+    first_clipped = np.minimum(first, len(crossings) - 1)
+    found = (first < len(crossings)) & (crossings[first_clipped] < offsets[1:] - 1)
+    i = crossings[first_clipped[found]]
+
+    t = z[i] / (z[i] - z[i + 1])
+    columns = [0, 1, 2, 7]
+    result[found] = data[i][:, columns] + t[:, None] * (data[i + 1][:, columns] - data[i][:, columns])
+    return result
+
+
+def closed_lines(data, offsets, max_radius=1.1):
+    """
+    Flags the lines whose last point is back near the Earth (Radius <= max_radius [Re]),
+    i.e. the closed lines with a conjugate footpoint. Open lines end far out in the tail.
+    """
+    return data[offsets[1:] - 1, 3] <= max_radius
+
+
+def flux_tube_integrals(data, offsets, max_radius=1.1):
+    """
+    Computes the integral quantities of every field line of the ragged layout.
+    Positions are in Re and the field in nT, so the flux tube volume (integral of ds/B) is in Re/nT.
+    The ionospheric field is taken at the first point (the traced footpoint) and the mirror ratio is
+    B_iono / B_eq, with B_eq the field at the equatorial crossing; Mirror_ratio_min uses the minimum
+    of |B| along the line instead. Open lines (see closed_lines) get NaN for the conjugate field
+    and both mirror ratios, as they have no conjugate footpoint.
+    Returns a DataFrame with one row per line.
+    """
+    xyz = data[:, :3]
+    B = data[:, 7]
+    ds = segment_lengths(xyz, offsets)
+    _, length = cumulative_trapezoid(np.ones(len(data)), ds, offsets)
+    _, volume = cumulative_trapezoid(1 / B, ds, offsets)
+
+    B_iono = B[offsets[:-1]]
+    B_min = np.minimum.reduceat(B, offsets[:-1])
+    equator = equatorial_crossing(data, offsets)
+    closed = closed_lines(data, offsets, max_radius)
+    B_conjugate = np.where(closed, B[offsets[1:] - 1], np.nan)
+
+    return pd.DataFrame({
+        'Points': np.diff(offsets),
+        'Closed': closed,
+        'Length_Re': length,
+        'Volume_Re_nT': volume,
+        'B_iono_nT': B_iono,
+        'B_conjugate_nT': B_conjugate,
+        'B_min_nT': B_min,
+        'Mirror_ratio': np.where(closed, B_iono / equator[:, 3], np.nan),
+        'Mirror_ratio_min': np.where(closed, B_iono / B_min, np.nan),
+        'X_eq_Re': equator[:, 0],
+        'Y_eq_Re': equator[:, 1],
+        'R_eq_Re': np.hypot(equator[:, 0], equator[:, 1]),
+        'B_eq_nT': equator[:, 3],
+    })
+
+
+# Main execution
+if __name__ == "__main__":
+    directories = ["../../data", "plot_alfven"]
+    patterns = ["B_*.txt", "T*.txt"]
+
+    for directory, pattern in zip(directories, patterns):
+        data, offsets, file_names = load_field_lines(directory, pattern)
+        summary = flux_tube_integrals(data, offsets)
+        summary.insert(0, 'File', [os.path.basename(file_name) for file_name in file_names])
+        print(summary.to_string(index=False))
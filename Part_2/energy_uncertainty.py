@@ -0,0 +1,215 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from substorm_detection import MINUTE_COLUMNS, R_E, epsilon_power
+
+PERCENTILES = (5, 16, 50, 84, 95)
+
+# Default 1-sigma uncertainties of the 1-min OMNI measurements (absolute, in the units of the columns)
+MEASUREMENT_SIGMA = {"Bx": 0.5, "By": 0.5, "Bz": 0.5, "B": 0.5, "v": 10.0}
+
+# Parameters which are positive by definition, drawn from a lognormal distribution
+POSITIVE_PARAMETERS = {"l_0", "gamma", "tau"}
+
+
+def epsilon_model(v, Bx, By, Bz, l_0):
+    """
+    Epsilon [W] from the IMF components [nT] and the flow speed [km/s], as in Exercise 4_1.
+    """
+    return epsilon_power(v, np.sqrt(Bx**2 + By**2 + Bz**2), By, Bz, l_0)
+
+
+def epsilon_model_total(v, B, By, Bz, l_0):
+    """
+    Epsilon [W] from |B|, By, Bz [nT] and the flow speed [km/s], for data with a field magnitude column.
+    """
+    return epsilon_power(v, B, By, Bz, l_0)
+
+
+# Formula 1: UJ [GW] = a * AE + b
+def uj_model(AE, a, b):
+    return a * AE + b
+
+
+# Formula 2: UA [GW] = a * AE**gamma + b
+def ua_model(AE, a, gamma, b):
+    return a * AE**gamma + b
+
+
+# Formula 3: URC [GW] = -4e4 * (dDst*/dt + Dst*/tau), with t and tau in seconds
+def urc_model(dDst_dt, Dst_star, tau):
+    return -4e4 * (dDst_dt + Dst_star / tau)
+
+
+def trapezoid_weights(times):
+    """
+    Weights w such that sum(w * power) is the trapezoid integral of power over times [s],
+    so the integral can be accumulated chunk by chunk.
+    """
+    seconds = (np.asarray(times, dtype="datetime64[ns]") - np.datetime64(times[0], "ns")) / np.timedelta64(1, "s")
+    dt = np.diff(seconds)
+    weights = np.zeros(len(seconds))
+    weights[:-1] += dt / 2
+    weights[1:] += dt / 2
+    return weights
+
+
+def draw_parameters(rng, parameters, n_members, positive=POSITIVE_PARAMETERS):
+    """
+    Draws n_members values of every model parameter, given either as a fixed value, as a
+    (mean, sigma) pair or as an array of already drawn values (one per member).
+    The parameters named in positive are drawn from the lognormal distribution with that mean
+    and sigma, so they never reach zero or change sign; the others from a normal distribution.
+    Returns a dict of (n_members, 1) arrays, ready to broadcast against (n_members, T) inputs.
+    """
+    drawn = {}
+    for name, value in parameters.items():
+        if isinstance(value, np.ndarray):
+            drawn[name] = value.reshape(n_members, 1)
+        elif np.ndim(value) == 0:
+            drawn[name] = np.full((n_members, 1), float(value))
+        elif name in positive:
+            mean, sigma = value
+            sigma_log = np.sqrt(np.log1p((sigma / mean)**2))
+            drawn[name] = rng.lognormal(np.log(mean) - sigma_log**2 / 2, sigma_log, size=(n_members, 1))
+        else:
+            mean, sigma = value
+            drawn[name] = rng.normal(mean, sigma, size=(n_members, 1))
+    return drawn
+
+
+def evaluate_chunk(task):
+    """
+    Evaluates the whole ensemble over one time chunk as a single (n_members, chunk) broadcast.
+    Returns the percentiles of the power at every time of the chunk and the
+    contribution of the chunk to the integrated energy of every member.
+    """
+    model, inputs, sigmas, drawn, weights, n_members, seed, percentiles = task
+    rng = np.random.default_rng(seed)
+    perturbed = {}
+    for name, values in inputs.items():
+        sigma = sigmas.get(name, 0.0)
+        if sigma:
+            perturbed[name] = values[None, :] + rng.normal(0.0, sigma, size=(n_members, len(values)))
+        else:
+            perturbed[name] = values[None, :]
+    power = np.broadcast_to(model(**perturbed, **drawn), (n_members, len(weights)))
+    return np.percentile(power, percentiles, axis=0), power @ weights
+
+
+def run_ensemble(model, inputs, weights, parameters, sigmas=None, n_members=1000, seed=None,
+                 percentiles=PERCENTILES, max_elements=4_000_000, processes=None):
+    """
+    Monte Carlo propagation of parameter and measurement uncertainty through model.
+    inputs are (T,) measurement series perturbed with the normal noise of sigmas (by name),
+    parameters are drawn once per member (see draw_parameters), and weights integrate the power
+    over time (see trapezoid_weights). The time axis is split into chunks of at most max_elements
+    ensemble values, so the full n_members x T matrix is never held at once; with processes set,
+    the chunks are evaluated in a process pool. The same seed gives the same result for any
+    number of processes.
+    Returns the (len(percentiles), T) power bands, the percentiles of the integrated energy
+    and the integrated energy of every member.
+    """
+    sigmas = sigmas or {}
+    inputs = {name: np.atleast_1d(np.asarray(values, dtype=np.float64)) for name, values in inputs.items()}
+    weights = np.atleast_1d(np.asarray(weights, dtype=np.float64))
+    chunk_size = max(1, max_elements // n_members)
+    starts = range(0, len(weights), chunk_size)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(starts) + 1)
+    drawn = draw_parameters(np.random.default_rng(seeds[0]), parameters, n_members)
+    tasks = [(model, {name: values[start:start + chunk_size] for name, values in inputs.items()}, sigmas, drawn,
+              weights[start:start + chunk_size], n_members, chunk_seed, percentiles)
+             for start, chunk_seed in zip(starts, seeds[1:])]
+
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(evaluate_chunk, tasks))
+    else:
+        results = [evaluate_chunk(task) for task in tasks]
+
+    bands = np.concatenate([band for band, _ in results], axis=1)
+    energies = np.sum([energy for _, energy in results], axis=0)
+    return bands, np.percentile(energies, percentiles), energies
+
+
+def epsilon_ensemble(df, columns=MINUTE_COLUMNS, l_0=(7 * R_E, 1 * R_E), sigmas=MEASUREMENT_SIGMA, **options):
+    """
+    Ensemble of the epsilon power over the rows of df (1-min OMNI data with a Datetime column).
+    l_0 is a fixed value or a (mean, sigma) pair [m]; options are passed on to run_ensemble.
+    Returns the power bands [W] as a DataFrame indexed by Datetime and the energy percentiles [J].
+    """
+    percentiles = options.get("percentiles", PERCENTILES)
+    names = ["v", "B", "By", "Bz"] if "B" in columns else ["v", "Bx", "By", "Bz"]
+    model = epsilon_model_total if "B" in columns else epsilon_model
+    inputs = {name: df[columns[name]].to_numpy(dtype=np.float64) for name in names}
+    weights = trapezoid_weights(df["Datetime"].to_numpy())
+    bands, energy, _ = run_ensemble(model, inputs, weights, {"l_0": l_0}, sigmas, **options)
+    labels = [f"P{p:g}" for p in percentiles]
+    return (pd.DataFrame(bands.T, index=df["Datetime"].to_numpy(), columns=labels).rename_axis("Datetime"),
+            pd.Series(energy, index=labels, name="Energy_J"))
+
+
+def budget_ensemble(AE, Dst_star, dDst_dt, duration, parameters, sigmas=None, **options):
+    """
+    Ensemble of the energy budget of Exercise 4_2 for one interval of duration [s]:
+    UJ, UA and URC [GW] and their energies [GJ].
+    parameters holds a, b, gamma and tau [s], each fixed or a (mean, sigma) pair;
+    sigmas holds the uncertainties of AE, Dst_star and dDst_dt.
+    Both the parameters and the perturbed measurements are drawn once per member and shared
+    by the three terms, so member i of UJ, UA and URC is one consistent realisation and the
+    terms can be summed member by member into the total budget.
+    Returns a DataFrame with the percentiles of the three powers, their sum and their energies,
+    and a DataFrame with the energies [GJ] of every member (UJ, UA, URC and Total columns).
+    """
+    sigmas = sigmas or {}
+    percentiles = options.get("percentiles", PERCENTILES)
+    n_members = options.get("n_members", 1000)
+    seeds = np.random.SeedSequence(options.pop("seed", None)).spawn(2)
+    drawn = draw_parameters(np.random.default_rng(seeds[0]), parameters, n_members)
+    measurements = {"AE": AE, "Dst_star": Dst_star, "dDst_dt": dDst_dt}
+    rng = np.random.default_rng(seeds[1])
+    for name, value in measurements.items():
+        drawn[name] = value + rng.normal(0.0, sigmas.get(name, 0.0), size=(n_members, 1))
+
+    terms = {
+        "UJ": (uj_model, ["AE", "a", "b"]),
+        "UA": (ua_model, ["AE", "a", "gamma", "b"]),
+        "URC": (urc_model, ["dDst_dt", "Dst_star", "tau"]),
+    }
+    rows = {}
+    members = {}
+    for term, (model, names) in terms.items():
+        # Everything is already drawn per member, so the ensemble has no further noise to add
+        bands, energy, members[term] = run_ensemble(model, {}, [duration], {name: drawn[name] for name in names},
+                                                    **options)
+        rows[f"{term}_GW"] = bands[:, 0]
+        rows[f"{term}_energy_GJ"] = energy
+    members = pd.DataFrame(members)
+    members["Total"] = members[list(terms)].sum(axis=1)
+    rows["Total_GW"] = np.percentile(members["Total"] / duration, percentiles)
+    rows["Total_energy_GJ"] = np.percentile(members["Total"], percentiles)
+    return pd.DataFrame(rows, index=[f"P{p:g}" for p in percentiles]).T, members
+
+
+# Main execution
+if __name__ == "__main__":
+    from datetime import datetime
+
+    # Substorm interval of Exercise 4_1
+    data = pd.read_csv("../Data/Omni/filtered_omni_data_20221123_20221127.csv", parse_dates=["Datetime"])
+    start_time = datetime(2022, 11, 25, 18, 32, 0)
+    end_time = datetime(2022, 11, 25, 20, 11, 0)
+    substorm_data = data[(data["Datetime"] >= start_time) & (data["Datetime"] <= end_time)]
+
+    bands, energy = epsilon_ensemble(substorm_data, n_members=100_000, seed=345, processes=4)
+    print(bands.head())
+    print(energy)
+
+    # Energy budget of Exercise 4_2
+    parameters = {"a": (0.1, 0.01), "b": 0, "gamma": (0.39, 0.02), "tau": (7.7 * 3600, 2 * 3600)}
+    sigmas = {"AE": 100e-9, "Dst_star": 2.0, "dDst_dt": 1.0 / 7200}
+    budget, members = budget_ensemble(AE=1500e-9, Dst_star=-13, dDst_dt=(-13 - 8) / (120 * 60), duration=6060,
+                             parameters=parameters, sigmas=sigmas, n_members=100_000, seed=345)
+    print(budget)
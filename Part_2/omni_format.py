@@ -0,0 +1,197 @@
+import mmap
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# One item of an OMNIWeb subset description, e.g. " 4 Scalar B, nT                  F6.1"
+FMT_LINE = re.compile(r'^\s*(\d+)\s+(.+?)\s+([IF])(\d+)(?:\.(\d+))?\s*$')
+
+# Any numbered item line, whatever its format
+ITEM_LINE = re.compile(r'^\s*\d+\s+\S')
+
+
+def fill_value(kind, width, decimals=0):
+    """
+    Returns the OMNIWeb fill value of a field with the given Fortran format.
+    OMNIWeb marks missing data with all nines, leaving the first character of the field blank,
+    e.g. I6 -> 99999, F6.1 -> 999.9, F6.0 -> 9999., F6.2 -> 99.99.
+    Some fields do not follow this rule (e.g. the proton fluxes, F9.2 with fill 999999.99,
+    or Lyman alpha, F9.6 with fill 0.999999); pass their fill values to read_fmt explicitly.
+    """
+    if kind == 'I':
+        return int('9' * (width - 1))
+    integer_digits = width - 2 - decimals
+    return float('9' * integer_digits + '.' + '9' * decimals)
+
+
+def unique_names(fields):
+    """
+    Renames the fields whose names collide, e.g. "BY, nT (GSE)" and "BY, nT (GSM)" in subsets
+    holding both coordinate systems, by keeping the parenthesised suffix of the item: "BY (GSE)", "BY (GSM)".
+    Names still colliding after that get the item number appended.
+    """
+    for attempt in range(2):
+        counts = {}
+        for field in fields:
+            counts[field['name']] = counts.get(field['name'], 0) + 1
+        for field in fields:
+            if counts[field['name']] < 2:
+                continue
+            suffix = re.search(r'\(([^()]*)\)\s*$', field['unit']) if attempt == 0 else None
+            if suffix:
+                field['name'] = f"{field['name']} ({suffix.group(1).strip()})"
+            elif attempt == 1:
+                field['name'] = f"{field['name']} #{field['item']}"
+    return fields
+
+
+def read_fmt(fmt_file, fill_values=None):
+    """
+    Parses an OMNIWeb .fmt file describing a fixed-width .lst subset.
+    Returns a list of fields (dicts) with the name, unit, Fortran format, character span and fill value.
+    The name is the part of the item before the first comma, the unit is the rest (if any);
+    colliding names are made unique (see unique_names).
+    fill_values maps field names (after renaming) to fill values overriding the ones of fill_value.
+    Numbered item lines with a format other than Iw or Fw.d raise a ValueError, as skipping them
+    would shift the character span of every following field.
+    """
+    fields = []
+    start = 0
+    with open(fmt_file, 'r') as infile:
+        for line in infile:
+            match = FMT_LINE.match(line)
+            if not match:
+                if ITEM_LINE.match(line):
+                    raise ValueError(f"Unsupported format in {fmt_file}: {line.strip()}")
+                continue
+            number, item, kind, width, decimals = match.groups()
+            width = int(width)
+            decimals = int(decimals) if decimals else 0
+            name, _, unit = item.partition(',')
+            fields.append({
+                'item': int(number),
+                'name': name.strip(),
+                'unit': unit.strip(),
+                'format': f"{kind}{width}" + (f".{decimals}" if kind == 'F' else ""),
+                'kind': kind,
+                'width': width,
+                'decimals': decimals,
+                'start': start,
+                'stop': start + width,
+                'fill': fill_value(kind, width, decimals),
+            })
+            start += width
+    if not fields:
+        raise ValueError(f"No field descriptions found in {fmt_file}")
+    fields = unique_names(fields)
+    for field in fields:
+        if fill_values and field['name'] in fill_values:
+            field['fill'] = fill_values[field['name']]
+    return fields
+
+
+def record_dtype(fields, record_length):
+    """
+    Builds a structured dtype of raw byte strings matching one fixed-width record.
+    Any characters after the last field (line terminator, trailing blanks) go to the '_tail' field.
+    """
+    names = [field['name'] for field in fields]
+    formats = [f"S{field['width']}" for field in fields]
+    offsets = [field['start'] for field in fields]
+    tail = record_length - fields[-1]['stop']
+    if tail < 0:
+        raise ValueError(f"Record length {record_length} is shorter than the format ({fields[-1]['stop']})")
+    if tail:
+        names.append('_tail')
+        formats.append(f"S{tail}")
+        offsets.append(fields[-1]['stop'])
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': record_length})
+
+
+def decode_records(buffer, fields):
+    """
+    Decodes a buffer holding whole fixed-width records laid out according to fields.
+    Returns two structured arrays: the decoded values (int64 for I, float64 for F fields)
+    and the boolean masks which are True where a field holds its fill value.
+    The decoded arrays are copies, so no view into buffer outlives the call.
+    """
+    values = np.empty(0, dtype=[(f['name'], np.int64 if f['kind'] == 'I' else np.float64) for f in fields])
+    masks = np.empty(0, dtype=[(f['name'], np.bool_) for f in fields])
+    view = raw = None
+    try:
+        view = np.frombuffer(buffer, dtype=np.uint8)
+        if not len(view):
+            return values, masks
+        newline = np.flatnonzero(view[:4096] == ord('\n'))
+        record_length = int(newline[0]) + 1 if len(newline) else len(view)
+        if len(view) % record_length:
+            # The last line may lack its terminator
+            if (len(view) + 1) % record_length:
+                raise ValueError("The records are not of equal length, the file is not fixed-width")
+            view = np.concatenate((view, np.frombuffer(b'\n', dtype=np.uint8)))
+
+        raw = view.view(record_dtype(fields, record_length))
+        values = np.empty(len(raw), dtype=values.dtype)
+        masks = np.empty(len(raw), dtype=masks.dtype)
+        for field in fields:
+            values[field['name']] = raw[field['name']].astype(values.dtype[field['name']])
+            masks[field['name']] = values[field['name']] == field['fill']
+        return values, masks
+    finally:
+        # Release the views before the caller closes a memory-mapped buffer, also when decoding fails
+        del view, raw
+
+
+def read_lst(lst_file, fields):
+    """
+    Decodes an OMNIWeb .lst file in bulk from a memory-mapped buffer.
+    fields is either the result of read_fmt or a path to the matching .fmt file.
+    Returns the values and the fill masks (see decode_records); an empty file gives zero rows.
+    """
+    if isinstance(fields, (str, bytes)) or hasattr(fields, '__fspath__'):
+        fields = read_fmt(fields)
+    with open(lst_file, 'rb') as infile:
+        if os.fstat(infile.fileno()).st_size == 0:
+            return decode_records(b'', fields)  # Empty files cannot be memory-mapped
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return decode_records(buffer, fields)
+
+
+def load_omni(lst_file, fmt_file, fill_values=None):
+    """
+    Loads an OMNIWeb subset into a Pandas DataFrame, one column per field of the .fmt file.
+    Fill values are replaced with NaN. If the subset holds the YEAR and DOY (or Day) columns,
+    a Datetime column is added from YEAR, DOY and the optional Hour and Minute columns.
+    fill_values overrides the fill value of some fields (see read_fmt).
+    """
+    fields = read_fmt(fmt_file, fill_values)
+    values, masks = read_lst(lst_file, fields)
+    df = pd.DataFrame({field['name']: values[field['name']] for field in fields})
+    for field in fields:
+        if masks[field['name']].any():
+            df[field['name']] = df[field['name']].where(~masks[field['name']])
+
+    columns = {column.upper(): column for column in df.columns}
+    if 'DAY' in columns and 'DOY' not in columns:
+        columns['DOY'] = columns['DAY']  # The 1-min subsets name the day of the year "Day"
+    if 'YEAR' in columns and 'DOY' in columns:
+        offset = pd.to_timedelta(df[columns['DOY']] - 1, unit='D')
+        if 'HOUR' in columns:
+            offset += pd.to_timedelta(df[columns['HOUR']], unit='h')
+        if 'MINUTE' in columns:
+            offset += pd.to_timedelta(df[columns['MINUTE']], unit='min')
+        df['Datetime'] = pd.to_datetime(df[columns['YEAR']].astype(str), format='%Y') + offset
+    return df
+
+
+# Main execution
+if __name__ == "__main__":
+    fmt_file = "../data/omni.fmt"
+    lst_file = "../data/omni.lst"
+
+    for field in read_fmt(fmt_file):
+        print(f"{field['name']:<20} {field['format']:<5} [{field['start']:>3}:{field['stop']:<3}] fill {field['fill']}")
+
+    omni_data = load_omni(lst_file, fmt_file)
+    print(omni_data)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+# Burton et al. (1975) constants
+B_PRESSURE = 15.8  # Pressure correction coefficient (nT / nPa^0.5)
+C_QUIET = 20.0  # Quiet time magnetopause current contribution (nT)
+TAU = 7.7 * 3600  # Ring current decay time (s)
+
+
+def pressure_corrected_dst(dst, pressure, b=B_PRESSURE, c=C_QUIET):
+    """
+    Dst* [nT] = Dst - b * sqrt(P) + c, removing the magnetopause current contribution
+    driven by the solar wind dynamic pressure P [nPa].
+    """
+    return dst - b * np.sqrt(pressure) + c
+
+
+def fill_gaps(values, initial=np.nan):
+    """
+    Replaces the NaN entries of values (e.g. OMNI fill values) with the last valid value before them,
+    or with initial if there is none. Only past rows are used, so the result does not change as new rows arrive.
+    """
+    values = np.concatenate(([initial], values))
+    last_valid = np.maximum.accumulate(np.where(np.isnan(values), 0, np.arange(len(values))))
+    return values[last_valid][1:]
+
+
+def burton_terms(times, dst, pressure, tau=TAU, b=B_PRESSURE, c=C_QUIET, previous=None, last_pressure=np.nan):
+    """
+    Computes the Burton model terms over a Dst record in one vectorized pass:
+    dDst*/dt = Q - Dst*/tau, with the injection Q and the decay Dst*/tau in nT/h, and the ring current
+    energy input U_RC [GW] = -4e4 * (dDst*/dt + Dst*/tau) with Dst* in nT and t, tau in s.
+    The derivative is a backward difference, so it only depends on past rows; the first row uses
+    previous = (time, Dst*) of the row before the record if given and is NaN otherwise.
+    Pressure gaps are filled with the last valid pressure (last_pressure before the record).
+    tau [s] may be a scalar or an array with one value per row (e.g. Kp dependent).
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    seconds = (times - times[:1]) / np.timedelta64(1, "s")
+    pressure = fill_gaps(np.asarray(pressure, dtype=np.float64), last_pressure)
+    dst_star = pressure_corrected_dst(np.asarray(dst, dtype=np.float64), pressure, b, c)
+
+    derivative = np.full(len(dst_star), np.nan)
+    derivative[1:] = np.diff(dst_star) / np.diff(seconds)
+    if previous is not None and len(times):
+        previous_time, previous_dst_star = previous
+        dt = (times[0] - np.datetime64(previous_time, "ns")) / np.timedelta64(1, "s")
+        derivative[0] = (dst_star[0] - previous_dst_star) / dt
+
+    decay = dst_star / tau
+    injection = derivative + decay
+    return pd.DataFrame({
+        "Datetime": times,
+        "Dst_star_nT": dst_star,
+        "dDst_star_dt_nT_h": derivative * 3600,
+        "Injection_nT_h": injection * 3600,
+        "Decay_nT_h": decay * 3600,
+        "URC_GW": -4e4 * injection,
+    })
+
+
+def burton_from_omni(df, tau=TAU, b=B_PRESSURE, c=C_QUIET):
+    """
+    Runs burton_terms over an hourly OMNIWeb DataFrame (see omni_format.load_omni)
+    with the Datetime, Dst-index and Flow pressure columns.
+    """
+    return burton_terms(df["Datetime"], df["Dst-index"], df["Flow pressure"], tau, b, c)
+
+
+class BurtonStream:
+    """
+    Keeps the Burton model running as new hourly rows arrive.
+    Each update returns the terms of the new rows only, identical to the ones
+    burton_terms would give over the whole record.
+    The tau given here is a scalar default; a per-row (e.g. Kp dependent) tau is passed
+    with each update, one value per new row.
+    """
+
+    def __init__(self, tau=TAU, b=B_PRESSURE, c=C_QUIET):
+        self.tau = tau
+        self.b = b
+        self.c = c
+        self.previous = None  # (time, Dst*) of the last row seen
+        self.last_pressure = np.nan  # Last valid pressure, to bridge gaps at the start of an update
+
+    def update(self, times, dst, pressure, tau=None):
+        """
+        Computes the terms of the new rows; tau [s] (scalar or one value per new row)
+        overrides the default of the stream for these rows.
+        """
+        times = np.asarray(times, dtype="datetime64[ns]")
+        pressure = np.asarray(pressure, dtype=np.float64)
+        tau = self.tau if tau is None else tau
+        terms = burton_terms(times, dst, pressure, tau, self.b, self.c, self.previous, self.last_pressure)
+        if len(times):
+            self.previous = (times[-1], terms["Dst_star_nT"].iloc[-1])
+            self.last_pressure = fill_gaps(pressure, self.last_pressure)[-1]
+        return terms
+
+    def update_omni(self, df, tau=None):
+        """
+        Same as update, for new rows of an hourly OMNIWeb DataFrame.
+        """
+        return self.update(df["Datetime"], df["Dst-index"], df["Flow pressure"], tau)
+
+
+# Main execution
+if __name__ == "__main__":
+    from omni_format import load_omni
+
+    omni_data = load_omni("../data/omni.lst", "../data/omni.fmt")
+    terms = burton_from_omni(omni_data)
+    print(terms.to_string())
+
+    # The same record fed row by row, as it would arrive from OMNIWeb
+    stream = BurtonStream()
+    streamed = pd.concat([stream.update_omni(omni_data.iloc[[i]]) for i in range(len(omni_data))], ignore_index=True)
+    print(f"Streamed terms match the batch solution: {np.allclose(streamed['URC_GW'], terms['URC_GW'], equal_nan=True)}")
+
+    # A per-row tau is passed with the rows it belongs to
+    tau = np.linspace(5, 10, len(omni_data)) * 3600
+    terms = burton_terms(omni_data["Datetime"], omni_data["Dst-index"], omni_data["Flow pressure"], tau)
+    stream = BurtonStream()
+    streamed = pd.concat([stream.update_omni(omni_data.iloc[start:start + 24], tau[start:start + 24])
+                          for start in range(0, len(omni_data), 24)], ignore_index=True)
+    print(f"Streamed terms with a per-row tau match: {np.allclose(streamed['URC_GW'], terms['URC_GW'], equal_nan=True)}")
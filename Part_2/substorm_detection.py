@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+mu_0 = 4 * np.pi * 1e-7  # Vacuum permeability (H/m)
+R_E = 6.371e6  # Earth radius (m)
+
+# Column names of the filtered 1-min OMNI data (see omni_processing.filter_data)
+MINUTE_COLUMNS = {"Bx": "Bx_nT_GSE_GSM", "By": "By_nT_GSE", "Bz": "Bz_nT_GSE", "v": "Flow_Speed_km_s"}
+
+# Column names of the hourly OMNIWeb subset (see omni_format.load_omni)
+HOURLY_COLUMNS = {"B": "Scalar B", "By": "BY", "Bz": "BZ", "v": "SW Plasma Speed", "Dst": "Dst-index"}
+
+
+def epsilon_power(v_km_s, B_nT, By_nT, Bz_nT, l_0=7 * R_E):
+    """
+    Akasofu epsilon parameter [W] as in Exercise 4_1:
+    epsilon = 4 pi / mu_0 * v * B^2 * sin^4(theta / 2) * l_0^2, theta = arctan2(By, Bz).
+    Works element-wise on arrays (and broadcasts, e.g. over an ensemble of l_0).
+    """
+    theta = np.arctan2(By_nT, Bz_nT)
+    return (4 * np.pi / mu_0) * (v_km_s * 1e3) * (B_nT * 1e-9)**2 * np.sin(theta / 2)**4 * l_0**2
+
+
+def data_epsilon(df, columns=MINUTE_COLUMNS, l_0=7 * R_E):
+    """
+    Computes epsilon [W] for every row of df, taking |B| from the 'B' column
+    or from the 'Bx', 'By' and 'Bz' components if there is none.
+    """
+    By = df[columns["By"]].to_numpy(dtype=np.float64)
+    Bz = df[columns["Bz"]].to_numpy(dtype=np.float64)
+    if "B" in columns:
+        B = df[columns["B"]].to_numpy(dtype=np.float64)
+    else:
+        B = np.sqrt(df[columns["Bx"]].to_numpy(dtype=np.float64)**2 + By**2 + Bz**2)
+    return epsilon_power(df[columns["v"]].to_numpy(dtype=np.float64), B, By, Bz, l_0)
+
+
+def rate_of_change(times, values, window):
+    """
+    Rate of change of values per hour over a window (a Timedelta) of time: every row is compared
+    with the earliest row at most window before it, so data holes do not stretch the window.
+    NaN where there is no earlier row within the window.
+    """
+    seconds = (times - times[:1]) / np.timedelta64(1, 's')
+    reference = np.searchsorted(times, times - pd.Timedelta(window).to_timedelta64(), side='left')
+    elapsed = seconds - seconds[reference]
+    rate = np.full(len(values), np.nan)
+    earlier = elapsed > 0
+    rate[earlier] = (values[earlier] - values[reference[earlier]]) / elapsed[earlier] * 3600
+    return rate
+
+
+def substorm_flags(df, columns=MINUTE_COLUMNS, bz_threshold=-2.0, epsilon_threshold=1e11,
+                   ae_rate_threshold=300.0, dst_rate_threshold=-10.0, rate_window="1h"):
+    """
+    Flags every row of df (which needs a Datetime column) for the two substorm phases.
+    Loading: southward Bz below bz_threshold [nT] and epsilon above epsilon_threshold [W].
+    Expansion: AE rising faster than ae_rate_threshold [nT/h] or Dst falling faster than
+    dst_rate_threshold [nT/h], over rate_window; None if df has neither an 'AE' nor a 'Dst' column.
+    Missing data never raises a flag.
+    """
+    times = df["Datetime"].to_numpy(dtype="datetime64[ns]")
+    Bz = df[columns["Bz"]].to_numpy(dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        loading = (Bz < bz_threshold) & (data_epsilon(df, columns) > epsilon_threshold)
+
+    expansion = None
+    with np.errstate(invalid="ignore"):
+        if "AE" in columns:
+            rate = rate_of_change(times, df[columns["AE"]].to_numpy(dtype=np.float64), rate_window)
+            expansion = rate > ae_rate_threshold
+        if "Dst" in columns:
+            rate = rate_of_change(times, df[columns["Dst"]].to_numpy(dtype=np.float64), rate_window)
+            expansion = (rate < dst_rate_threshold) | (expansion if expansion is not None else False)
+    return loading, expansion
+
+
+def run_lengths(mask, breaks=None):
+    """
+    Run-length encodes the True runs of a boolean array.
+    breaks (optional, one entry per pair of consecutive rows) ends a run between two rows
+    even if both are True, e.g. across a hole in the data.
+    Returns the start indexes and the (exclusive) end indexes of the runs.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    continues = np.zeros(len(mask), dtype=bool)
+    continues[1:] = mask[1:] & mask[:-1]
+    if breaks is not None:
+        continues[1:] &= ~breaks
+    starts = np.flatnonzero(mask & ~continues)
+    ends = np.flatnonzero(mask & ~np.concatenate((continues[1:], [False]))) + 1
+    return starts, ends
+
+
+def flagged_intervals(times, mask, min_duration="30min", max_gap="5min"):
+    """
+    Turns a flag array into intervals: runs are broken where consecutive rows are more than
+    max_gap apart (holes in the data), runs separated by at most max_gap are merged,
+    then the ones shorter than min_duration are dropped.
+    Returns a DataFrame with Onset, End (the last flagged row) and Duration_s columns.
+    """
+    max_gap = pd.Timedelta(max_gap).to_timedelta64()
+    starts, ends = run_lengths(mask, np.diff(times) > max_gap)
+    onset = times[starts]
+    end = times[ends - 1]
+
+    if len(starts) > 1:
+        # Merge runs whose gap is short, i.e. keep only the boundaries around long gaps
+        long_gap = (onset[1:] - end[:-1]) > max_gap
+        onset = onset[np.concatenate(([True], long_gap))]
+        end = end[np.concatenate((long_gap, [True]))]
+
+    duration = end - onset
+    keep = duration >= pd.Timedelta(min_duration).to_timedelta64()
+    return pd.DataFrame({
+        "Onset": onset[keep],
+        "End": end[keep],
+        "Duration_s": duration[keep] / np.timedelta64(1, "s"),
+    })
+
+
+def detect_substorms(df, columns=MINUTE_COLUMNS, min_duration="30min", max_gap="5min", **thresholds):
+    """
+    Builds the event catalog of df: one row per loading and expansion interval
+    with the Phase, Onset, End and Duration_s columns, sorted by onset.
+    thresholds are passed on to substorm_flags.
+    """
+    loading, expansion = substorm_flags(df, columns, **thresholds)
+    return catalog_from_flags(df["Datetime"].to_numpy(dtype="datetime64[ns]"), loading, expansion, min_duration, max_gap)
+
+
+def catalog_from_flags(times, loading, expansion, min_duration="30min", max_gap="5min"):
+    """
+    Assembles the event catalog from the per-row phase flags (see detect_substorms).
+    """
+    phases = [("loading", loading), ("expansion", expansion)]
+    catalog = [flagged_intervals(times, mask, min_duration, max_gap).assign(Phase=phase)
+               for phase, mask in phases if mask is not None]
+    catalog = pd.concat(catalog, ignore_index=True)[["Phase", "Onset", "End", "Duration_s"]]
+    return catalog.sort_values("Onset", kind="stable").reset_index(drop=True)
+
+
+def scan_archive(chunks, columns=MINUTE_COLUMNS, min_duration="30min", max_gap="5min", rate_window="1h", **thresholds):
+    """
+    Builds the event catalog of an archive too large to hold as one DataFrame,
+    e.g. pd.read_csv(..., parse_dates=["Datetime"], chunksize=...) over years of OMNI data.
+    Each chunk is flagged in one vectorized pass, with the rows of the previous chunk within rate_window
+    of its end prepended, so the rates of change are the same as over the whole record; the intervals
+    are then found over the whole flag record, so events crossing chunk boundaries are not split.
+    """
+    times, loading, expansion = [], [], []
+    previous = None
+    for chunk in chunks:
+        overlap = 0
+        if previous is not None:
+            overlap = len(previous)
+            chunk = pd.concat([previous, chunk], ignore_index=True)
+        chunk_loading, chunk_expansion = substorm_flags(chunk, columns, rate_window=rate_window, **thresholds)
+        times.append(chunk["Datetime"].to_numpy(dtype="datetime64[ns]")[overlap:])
+        loading.append(chunk_loading[overlap:])
+        if chunk_expansion is not None:
+            expansion.append(chunk_expansion[overlap:])
+
+        # Keep every row the rate window of the next chunk can reach back to
+        tail = chunk["Datetime"] >= chunk["Datetime"].iloc[-1] - pd.Timedelta(rate_window)
+        previous = chunk[tail].reset_index(drop=True)
+
+    if not times:
+        return pd.DataFrame(columns=["Phase", "Onset", "End", "Duration_s"])
+    return catalog_from_flags(np.concatenate(times), np.concatenate(loading),
+                              np.concatenate(expansion) if expansion else None, min_duration, max_gap)
+
+
+def interval_energy(times, power, catalog):
+    """
+    Integrates a power time series [W] over every interval of the catalog (trapezoid rule).
+    Returns the energies [J] as an array aligned with the catalog rows.
+    """
+    seconds = (times - times[0]) / np.timedelta64(1, "s")
+    power = np.nan_to_num(power)
+    cumulative = np.concatenate(([0.0], np.cumsum(0.5 * (power[1:] + power[:-1]) * np.diff(seconds))))
+    onset = (catalog["Onset"].to_numpy(dtype="datetime64[ns]") - times[0]) / np.timedelta64(1, "s")
+    end = (catalog["End"].to_numpy(dtype="datetime64[ns]") - times[0]) / np.timedelta64(1, "s")
+    return np.interp(end, seconds, cumulative) - np.interp(onset, seconds, cumulative)
+
+
+# Main execution
+if __name__ == "__main__":
+    from omni_format import load_omni
+
+    # 1-min data, read in chunks as a multi-year archive would be
+    file_path = "../Data/Omni/filtered_omni_data_20221123_20221127.csv"
+    chunks = pd.read_csv(file_path, parse_dates=["Datetime"], chunksize=2000)
+    catalog = scan_archive(chunks, MINUTE_COLUMNS)
+    data = pd.read_csv(file_path, parse_dates=["Datetime"])
+    times = data["Datetime"].to_numpy(dtype="datetime64[ns]")
+    catalog["Epsilon_energy_J"] = interval_energy(times, data_epsilon(data, MINUTE_COLUMNS), catalog)
+    print(catalog.to_string())
+
+    # Hourly OMNIWeb subset, which also has the Dst index
+    omni_data = load_omni("../data/omni.lst", "../data/omni.fmt")
+    hourly_catalog = detect_substorms(omni_data, HOURLY_COLUMNS, min_duration="2h", max_gap="1h")
+    print(hourly_catalog.to_string())
+
+    # With a Dst column the rates of change cross chunk boundaries, which must not change the catalog
+    hourly_chunks = (omni_data.iloc[start:start + 10] for start in range(0, len(omni_data), 10))
+    chunked_catalog = scan_archive(hourly_chunks, HOURLY_COLUMNS, min_duration="2h", max_gap="1h")
+    print(f"Chunked catalog matches the whole-record catalog: {chunked_catalog.equals(hourly_catalog)}")